@@ -4,11 +4,20 @@ from __future__ import annotations
 import csv
 import json
 import re
-from collections import defaultdict
+import sys
+from collections import Counter, defaultdict
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
 
 REPO_ROOT = Path("/home/workspace/workspace/leather-making/leathercraft-rebuild")
 DATA_ROOT = Path("/home/workspace/workspace/leather-making")
@@ -18,7 +27,36 @@ ACTION_TICKET_MAP_PATH = DATA_ROOT / "source_app_action_ticket_map.csv"
 ACTION_MATRIX_OUT = REPO_ROOT / "mainform_action_matrix.csv"
 FORM_SCHEMA_OUT = REPO_ROOT / "form_schema_options_export_stitching.json"
 
-HEADER_PATTERN = re.compile(r"^===\s+(.+?)\s+\|\s+(.+?)\s+\|")
+ACTION_SOURCE_FORMS = frozenset({"TfrmLeat", "TfrmLeat_Macintosh"})
+SCHEMA_TARGET_FORMS = frozenset(
+    {
+        "TfrmOptions",
+        "TfrmOptions_Macintosh",
+        "TfrmSVGExportOptions",
+        "TfrmSVGExportOptions_Macintosh",
+        "TfrmStitchingHoleSettings",
+        "TfrmChangeStitchingHoleType",
+        "TfrmEditPallet",
+        "TfrmEditPallet_Macintosh",
+        "TfrmPreview",
+        "TfrmPreview_Macintosh",
+        "TfrmRepository",
+        "TfrmRepository_Macintosh",
+    }
+)
+WANTED_FORMS = ACTION_SOURCE_FORMS | SCHEMA_TARGET_FORMS
+
+ACTION_MATRIX_FIELDNAMES = (
+    "action",
+    "aliases",
+    "source_forms",
+    "cluster",
+    "mapped_ticket",
+    "feature_group",
+    "phase",
+    "status",
+)
+ACTION_STATUS_INDEX = ACTION_MATRIX_FIELDNAMES.index("status")
 
 
 @dataclass
@@ -29,263 +67,338 @@ class FormSection:
     controls: list[str] = field(default_factory=list)
 
 
+EXECUTE_SUFFIX = "Execute"
+EXECUTE_SUFFIX_LENGTH = len(EXECUTE_SUFFIX)
+
+
+@lru_cache(maxsize=None)
 def canonicalize_action(action: str) -> str:
     value = action.strip()
-    if value.endswith("Execute"):
-        value = value[: -len("Execute")]
-    value = value.replace("LinePallet", "LinePalette")
-    return value
+    if value.endswith(EXECUTE_SUFFIX):
+        value = value[:-EXECUTE_SUFFIX_LENGTH]
+    if "LinePallet" in value:
+        value = value.replace("LinePallet", "LinePalette")
+    return sys.intern(value)
+
+
+def _compile_prefix_groups(groups: tuple[tuple[str, tuple[str, ...]], ...]) -> re.Pattern[str]:
+    return re.compile(
+        "|".join(f"(?P<{name}>{'|'.join(map(re.escape, prefixes))})" for name, prefixes in groups)
+    )
+
+
+CLUSTER_PREFIXES: tuple[tuple[str, tuple[str, ...]], ...] = (
+    ("Transforms", ("actAlign", "actRotate", "actScale", "actSpecify", "actSetAs", "actMoveOrCopy")),
+    ("LineTypePalette", ("actLinePalette", "actLinePallet")),
+    (
+        "GeometryEdit",
+        (
+            "actCenterLine",
+            "actConvert",
+            "actReversePath",
+            "actSplitIntoN",
+            "actDrawBoundary",
+            "actDrawGoldenSpiral",
+            "actDeleteDuplicates",
+            "actEditShapeSize",
+            "actEditLineAngle",
+            "actLineSymmetry",
+            "actDesignHelper_",
+        ),
+    ),
+    ("SelectionOrdering", ("actSelect", "actDeselect", "actDeleteSelected", "actCreateGroup", "actUngroup", "actOrder")),
+    (
+        "ProjectLifecycle",
+        ("actNewProject", "actLoadProject", "actSaveProject", "actClose", "actOpenDemoProject", "actOpenOptions", "actClearAll"),
+    ),
+    (
+        "ViewportDisplay",
+        (
+            "actShowHideGrid",
+            "actShowHideScale",
+            "actShowHideDimensionLines",
+            "actShowHidePrintAreas",
+            "actSetGridBackground",
+            "actResetView",
+        ),
+    ),
+    ("HelpLinks", ("actShow", "actView", "actVisit")),
+    ("SecretBonus", ("actSecret",)),
+    ("LayerAdvanced", ("actLayer", "actIgnoreLayer")),
+)
+
+CONTROL_KIND_PREFIXES: tuple[tuple[str, tuple[str, ...]], ...] = (
+    ("checkbox", ("chk",)),
+    ("select", ("cmb",)),
+    ("radio", ("rb",)),
+    ("number", ("nb",)),
+    ("text", ("ed",)),
+    ("button", ("btn",)),
+    ("label", ("lbl",)),
+    ("group", ("gb",)),
+    ("tab", ("tab",)),
+    ("tree", ("tv",)),
+    ("switch", ("sw", "switch")),
+)
+
+# Domains are checked in order, so each keeps its own pattern rather than sharing one alternation.
+CONTROL_DOMAIN_PATTERNS: tuple[tuple[str, re.Pattern[str]], ...] = tuple(
+    (domain, re.compile("|".join(tokens)))
+    for domain, tokens in (
+        ("stitching", ("stitch", "prick", "thread")),
+        ("export", ("svg", "dxf")),
+        ("print", ("print", "tile", "dpi")),
+        ("line-types", ("palette", "line", "color")),
+        ("options", ("auto", "pitch", "zoom", "save", "option")),
+        ("repository", ("repo", "catalog", "template")),
+    )
+)
+
+CLUSTER_PATTERN = _compile_prefix_groups(CLUSTER_PREFIXES)
+CONTROL_KIND_PATTERN = _compile_prefix_groups(CONTROL_KIND_PREFIXES)
 
 
 def classify_cluster(action: str) -> str:
-    if action.startswith(("actAlign", "actRotate", "actScale", "actSpecify", "actSetAs", "actMoveOrCopy")):
-        return "Transforms"
-    if action.startswith("actLinePalette") or action.startswith("actLinePallet"):
-        return "LineTypePalette"
-    if action.startswith(("actCenterLine", "actConvert", "actReversePath", "actSplitIntoN", "actDrawBoundary", "actDrawGoldenSpiral", "actDeleteDuplicates", "actEditShapeSize", "actEditLineAngle", "actLineSymmetry", "actDesignHelper_")):
-        return "GeometryEdit"
-    if action.startswith(("actSelect", "actDeselect", "actDeleteSelected", "actCreateGroup", "actUngroup", "actOrder")):
-        return "SelectionOrdering"
-    if action.startswith(("actNewProject", "actLoadProject", "actSaveProject", "actClose", "actOpenDemoProject", "actOpenOptions", "actClearAll")):
-        return "ProjectLifecycle"
-    if action.startswith(("actShowHideGrid", "actShowHideScale", "actShowHideDimensionLines", "actShowHidePrintAreas", "actSetGridBackground", "actResetView")):
-        return "ViewportDisplay"
-    if action.startswith(("actShow", "actView", "actVisit")):
-        return "HelpLinks"
-    if action.startswith("actSecret"):
-        return "SecretBonus"
-    if action.startswith(("actLayer", "actIgnoreLayer")):
-        return "LayerAdvanced"
-    return "Other"
+    match = CLUSTER_PATTERN.match(action)
+    return match.lastgroup if match else "Other"
 
 
 def infer_control_kind(control_id: str) -> str:
-    if control_id.startswith("chk"):
-        return "checkbox"
-    if control_id.startswith("cmb"):
-        return "select"
-    if control_id.startswith("rb"):
-        return "radio"
-    if control_id.startswith("nb"):
-        return "number"
-    if control_id.startswith("ed"):
-        return "text"
-    if control_id.startswith("btn"):
-        return "button"
-    if control_id.startswith("lbl"):
-        return "label"
-    if control_id.startswith("gb"):
-        return "group"
-    if control_id.startswith("tab"):
-        return "tab"
-    if control_id.startswith("tv"):
-        return "tree"
-    if control_id.startswith(("sw", "switch")):
-        return "switch"
-    return "other"
+    match = CONTROL_KIND_PATTERN.match(control_id)
+    return match.lastgroup if match else "other"
 
 
 def infer_control_domain(control_id: str) -> str:
     lower = control_id.lower()
-    if any(token in lower for token in ("stitch", "prick", "thread")):
-        return "stitching"
-    if any(token in lower for token in ("svg", "dxf")):
-        return "export"
-    if "print" in lower or "tile" in lower or "dpi" in lower:
-        return "print"
-    if any(token in lower for token in ("palette", "line", "color")):
-        return "line-types"
-    if any(token in lower for token in ("auto", "pitch", "zoom", "save", "option")):
-        return "options"
-    if any(token in lower for token in ("repo", "catalog", "template")):
-        return "repository"
+    for domain, pattern in CONTROL_DOMAIN_PATTERNS:
+        if pattern.search(lower):
+            return domain
     return "general"
 
 
-def parse_form_sections(path: Path) -> list[FormSection]:
-    forms: list[FormSection] = []
+def _iter_raw_lines(path: Path) -> Iterator[bytes]:
+    # Binary iteration only splits on LF; splitlines() also breaks on a lone CR, as text mode did.
+    with path.open("rb") as handle:
+        for chunk in handle:
+            yield from chunk.splitlines()
+
+
+def iter_form_sections(path: Path, wanted_forms: frozenset[str] | None = None) -> Iterator[FormSection]:
     current: FormSection | None = None
     mode: str | None = None
-
-    with path.open("r", encoding="utf-8") as handle:
-        for raw_line in handle:
-            line = raw_line.rstrip("\n")
-            header = HEADER_PATTERN.match(line)
-            if header:
+    intern = sys.intern
+    header_prefix = b"=== "
+    section_prefixes = (b"Actions (", b"Controls (")
+
+    for raw_line in _iter_raw_lines(path):
+        if raw_line.startswith(header_prefix):
+            parts = raw_line.decode("utf-8").split("|", 3)
+            resource_file = parts[0][4:].strip()
+            form_name = parts[1].strip() if len(parts) >= 3 else ""
+            if resource_file and form_name:
                 if current is not None:
-                    forms.append(current)
-                current = FormSection(resource_file=header.group(1).strip(), form_name=header.group(2).strip())
+                    yield current
+                if wanted_forms is not None and form_name not in wanted_forms:
+                    current = None
+                else:
+                    current = FormSection(resource_file=intern(resource_file), form_name=intern(form_name))
                 mode = None
                 continue
 
-            if current is None:
-                continue
+        if current is None:
+            continue
 
-            if line.startswith("Actions ("):
-                mode = "actions"
-                continue
-            if line.startswith("Controls ("):
-                mode = "controls"
-                continue
-            if not line.strip():
-                continue
-            if mode == "actions":
-                current.actions.append(line.strip())
-            elif mode == "controls":
-                current.controls.append(line.strip())
+        if raw_line.startswith(section_prefixes):
+            mode = "actions" if raw_line[:1] == b"A" else "controls"
+            continue
+        if mode is None:
+            continue
+        # Decode before stripping so Unicode whitespace is trimmed like str.strip() did.
+        value = raw_line.decode("utf-8").strip()
+        if not value:
+            continue
+        if mode == "actions":
+            current.actions.append(intern(value))
+        else:
+            current.controls.append(intern(value))
 
     if current is not None:
-        forms.append(current)
+        yield current
 
-    return forms
 
+def parse_form_sections(path: Path, wanted_forms: frozenset[str] | None = None) -> list[FormSection]:
+    return list(iter_form_sections(path, wanted_forms))
 
-def load_action_ticket_map(path: Path) -> dict[str, dict[str, str]]:
-    mapping: dict[str, dict[str, str]] = {}
-    with path.open("r", encoding="utf-8", newline="") as handle:
-        reader = csv.DictReader(handle)
-        for row in reader:
-            action = (row.get("action") or "").strip()
-            if action:
-                mapping[action] = row
-    return mapping
 
+TICKET_MAP_VALUE_COLUMNS = ("ticket_id", "feature_group", "phase")
 
-def build_action_matrix(forms: list[FormSection], ticket_map: dict[str, dict[str, str]]) -> list[dict[str, str]]:
-    by_action: dict[str, dict[str, set[str]]] = {}
-    source_forms = {"TfrmLeat", "TfrmLeat_Macintosh"}
 
-    for form in forms:
-        if form.form_name not in source_forms:
-            continue
-        for raw_action in form.actions:
-            canonical = canonicalize_action(raw_action)
-            if not canonical.startswith("act"):
-                continue
-            item = by_action.setdefault(canonical, {"aliases": set(), "forms": set()})
-            item["aliases"].add(raw_action)
-            item["forms"].add(form.form_name)
-
-    rows: list[dict[str, str]] = []
-    for canonical in sorted(by_action):
-        aliases = sorted(by_action[canonical]["aliases"])
-        forms_for_action = sorted(by_action[canonical]["forms"])
-
-        matched = ticket_map.get(canonical)
-        if matched is None:
-            for alias in aliases:
-                matched = ticket_map.get(alias)
-                if matched is not None:
-                    break
-
-        if matched is not None:
-            mapped_ticket = matched.get("ticket_id", "")
-            feature_group = matched.get("feature_group", "")
-            phase = matched.get("phase", "")
-            status = "mapped"
-        else:
-            mapped_ticket = ""
-            feature_group = ""
-            phase = ""
-            status = "unmapped"
+def load_action_ticket_map(path: Path) -> dict[str, tuple[str, str, str]]:
+    mapping: dict[str, tuple[str, str, str]] = {}
+    with path.open("r", encoding="utf-8-sig", newline="") as handle:
+        reader = csv.reader(handle)
+        header = next(reader, None)
+        if not header or "action" not in header:
+            return mapping
+        action_index = header.index("action")
+        value_indexes = [header.index(column) if column in header else None for column in TICKET_MAP_VALUE_COLUMNS]
+        for row in reader:
+            width = len(row)
+            action = row[action_index].strip() if action_index < width else ""
+            if action:
+                ticket_id, feature_group, phase = (
+                    row[index] if index is not None and index < width else "" for index in value_indexes
+                )
+                mapping[sys.intern(action)] = (ticket_id, feature_group, phase)
+    return mapping
 
-        rows.append(
-            {
-                "action": canonical,
-                "aliases": ";".join(aliases),
-                "source_forms": ";".join(forms_for_action),
-                "cluster": classify_cluster(canonical),
-                "mapped_ticket": mapped_ticket,
-                "feature_group": feature_group,
-                "phase": phase,
-                "status": status,
-            }
-        )
 
-    return rows
+def extend_ticket_map(ticket_map: dict[str, tuple[str, str, str]]) -> dict[str, tuple[str, str, str]]:
+    # Exact keys win; otherwise the lowest-sorted alias key for a canonical action does.
+    extended: dict[str, tuple[str, str, str]] = {}
+    for action in sorted(ticket_map):
+        extended.setdefault(canonicalize_action(action), ticket_map[action])
+    extended.update(ticket_map)
+    return extended
 
 
-def write_action_matrix(rows: list[dict[str, str]], destination: Path) -> None:
-    destination.parent.mkdir(parents=True, exist_ok=True)
-    fieldnames = ["action", "aliases", "source_forms", "cluster", "mapped_ticket", "feature_group", "phase", "status"]
-    with destination.open("w", encoding="utf-8", newline="") as handle:
-        writer = csv.DictWriter(handle, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
+def lookup_ticket(ticket_map: dict[str, tuple[str, str, str]], canonical: str) -> tuple[str, str, str, str]:
+    matched = ticket_map.get(canonical)
+    if matched is None:
+        return "", "", "", "unmapped"
+    mapped_ticket, feature_group, phase = matched
+    return mapped_ticket, feature_group, phase, "mapped"
 
 
-def build_form_schema(forms: list[FormSection]) -> dict[str, object]:
-    target_forms = {
-        "TfrmOptions",
-        "TfrmOptions_Macintosh",
-        "TfrmSVGExportOptions",
-        "TfrmSVGExportOptions_Macintosh",
-        "TfrmStitchingHoleSettings",
-        "TfrmChangeStitchingHoleType",
-        "TfrmEditPallet",
-        "TfrmEditPallet_Macintosh",
-        "TfrmPreview",
-        "TfrmPreview_Macintosh",
-        "TfrmRepository",
-        "TfrmRepository_Macintosh",
-    }
+@dataclass
+class ActionAccumulator:
+    aliases_by_action: defaultdict[str, list[str]] = field(default_factory=lambda: defaultdict(list))
+    forms_by_action: defaultdict[str, list[str]] = field(default_factory=lambda: defaultdict(list))
 
-    selected_forms = [form for form in forms if form.form_name in target_forms]
-    selected_forms.sort(key=lambda item: item.form_name)
+    def add(self, form: FormSection) -> None:
+        if form.form_name not in ACTION_SOURCE_FORMS:
+            return
+        for raw_action in form.actions:
+            canonical = canonicalize_action(raw_action)
+            if not canonical.startswith("act"):
+                continue
+            self.aliases_by_action[canonical].append(raw_action)
+            self.forms_by_action[canonical].append(form.form_name)
+
+    def rows(self, extended_ticket_map: dict[str, tuple[str, str, str]]) -> list[tuple[str, ...]]:
+        return [
+            (
+                canonical,
+                ";".join(aliases),
+                ";".join(sorted(set(self.forms_by_action[canonical]))),
+                classify_cluster(canonical),
+                *lookup_ticket(extended_ticket_map, canonical),
+            )
+            for canonical in sorted(self.aliases_by_action)
+            for aliases in (sorted(set(self.aliases_by_action[canonical])),)
+        ]
 
-    form_entries: list[dict[str, object]] = []
-    for form in selected_forms:
-        controls = []
-        kind_counts: dict[str, int] = defaultdict(int)
-        domain_counts: dict[str, int] = defaultdict(int)
 
+@dataclass
+class SchemaAccumulator:
+    form_entries: list[dict[str, object]] = field(default_factory=list)
+    control_cache: dict[str, dict[str, str]] = field(default_factory=dict)
+
+    def add(self, form: FormSection) -> None:
+        if form.form_name not in SCHEMA_TARGET_FORMS:
+            return
+        controls: list[dict[str, str]] = []
         for control_id in form.controls:
-            kind = infer_control_kind(control_id)
-            domain = infer_control_domain(control_id)
-            kind_counts[kind] += 1
-            domain_counts[domain] += 1
-            controls.append({"id": control_id, "kind": kind, "domain": domain})
-
-        form_entries.append(
+            entry = self.control_cache.get(control_id)
+            if entry is None:
+                entry = {
+                    "id": control_id,
+                    "kind": infer_control_kind(control_id),
+                    "domain": infer_control_domain(control_id),
+                }
+                self.control_cache[control_id] = entry
+            controls.append(entry)
+        kind_counts = Counter(entry["kind"] for entry in controls)
+        domain_counts = Counter(entry["domain"] for entry in controls)
+
+        self.form_entries.append(
             {
                 "form_name": form.form_name,
                 "resource_file": form.resource_file,
                 "action_count": len(form.actions),
                 "control_count": len(form.controls),
-                "kind_counts": dict(sorted(kind_counts.items())),
-                "domain_counts": dict(sorted(domain_counts.items())),
+                "kind_counts": {kind: kind_counts[kind] for kind in sorted(kind_counts)},
+                "domain_counts": {domain: domain_counts[domain] for domain in sorted(domain_counts)},
                 "controls": controls,
             }
         )
 
-    return {
-        "generated_at_utc": datetime.now(timezone.utc).isoformat(timespec="seconds"),
-        "source_files": {
-            "form_details": str(FORM_DETAILS_PATH),
-            "action_ticket_map": str(ACTION_TICKET_MAP_PATH),
-        },
-        "forms": form_entries,
-    }
+    def payload(self) -> dict[str, object]:
+        return {
+            "generated_at_utc": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "source_files": {
+                "form_details": str(FORM_DETAILS_PATH),
+                "action_ticket_map": str(ACTION_TICKET_MAP_PATH),
+            },
+            "forms": sorted(self.form_entries, key=lambda item: item["form_name"]),
+        }
+
+
+def build_action_matrix(
+    forms: Iterable[FormSection], ticket_map: dict[str, tuple[str, str, str]]
+) -> list[tuple[str, ...]]:
+    accumulator = ActionAccumulator()
+    for form in forms:
+        accumulator.add(form)
+    return accumulator.rows(extend_ticket_map(ticket_map))
+
+
+def write_action_matrix(rows: list[tuple[str, ...]], destination: Path) -> None:
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    with destination.open("w", encoding="utf-8", newline="", buffering=1 << 20) as handle:
+        writer = csv.writer(handle)
+        writer.writerow(ACTION_MATRIX_FIELDNAMES)
+        writer.writerows(rows)
+
+
+def build_form_schema(forms: Iterable[FormSection]) -> dict[str, object]:
+    accumulator = SchemaAccumulator()
+    for form in forms:
+        accumulator.add(form)
+    return accumulator.payload()
 
 
 def write_form_schema(payload: dict[str, object], destination: Path) -> None:
     destination.parent.mkdir(parents=True, exist_ok=True)
+    if orjson is not None:
+        destination.write_bytes(orjson.dumps(payload, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE))
+        return
     with destination.open("w", encoding="utf-8") as handle:
-        json.dump(payload, handle, indent=2)
+        json.dump(payload, handle, indent=2, ensure_ascii=False, check_circular=False)
         handle.write("\n")
 
 
 def main() -> None:
-    forms = parse_form_sections(FORM_DETAILS_PATH)
-    ticket_map = load_action_ticket_map(ACTION_TICKET_MAP_PATH)
-
-    action_rows = build_action_matrix(forms, ticket_map)
-    write_action_matrix(action_rows, ACTION_MATRIX_OUT)
-
-    form_schema = build_form_schema(forms)
-    write_form_schema(form_schema, FORM_SCHEMA_OUT)
-
-    mapped_count = sum(1 for row in action_rows if row["status"] == "mapped")
+    action_accumulator = ActionAccumulator()
+    schema_accumulator = SchemaAccumulator()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        ticket_map_future = executor.submit(load_action_ticket_map, ACTION_TICKET_MAP_PATH)
+        for form in iter_form_sections(FORM_DETAILS_PATH, WANTED_FORMS):
+            action_accumulator.add(form)
+            schema_accumulator.add(form)
+
+        action_rows = action_accumulator.rows(extend_ticket_map(ticket_map_future.result()))
+        form_schema = schema_accumulator.payload()
+
+        writes = [
+            executor.submit(write_action_matrix, action_rows, ACTION_MATRIX_OUT),
+            executor.submit(write_form_schema, form_schema, FORM_SCHEMA_OUT),
+        ]
+        for write in writes:
+            write.result()
+
+    mapped_count = sum(1 for row in action_rows if row[ACTION_STATUS_INDEX] == "mapped")
     print(f"Wrote {ACTION_MATRIX_OUT} ({len(action_rows)} actions, {mapped_count} mapped)")
     print(f"Wrote {FORM_SCHEMA_OUT} ({len(form_schema['forms'])} forms)")
 
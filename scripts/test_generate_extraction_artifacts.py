@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import importlib.util
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+_SPEC = importlib.util.spec_from_file_location(
+    "generate_extraction_artifacts", Path(__file__).with_name("generate_extraction_artifacts.py")
+)
+artifacts = importlib.util.module_from_spec(_SPEC)
+sys.modules[_SPEC.name] = artifacts
+_SPEC.loader.exec_module(artifacts)
+
+
+class IterFormSectionsTest(unittest.TestCase):
+    def parse(self, content: str) -> list[tuple[str, str, list[str], list[str]]]:
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "rsrc_form_details.txt"
+            path.write_bytes(content.encode("utf-8"))
+            return [
+                (form.resource_file, form.form_name, form.actions, form.controls)
+                for form in artifacts.iter_form_sections(path)
+            ]
+
+    def test_line_endings(self) -> None:
+        expected = [("a.bin", "TfrmLeat", ["actFoo"], ["btnOk"])]
+        for newline in ("\n", "\r\n", "\r"):
+            with self.subTest(newline=repr(newline)):
+                lines = ["=== a.bin | TfrmLeat | size=1", "Actions (1):", "  actFoo", "Controls (1):", "  btnOk", ""]
+                self.assertEqual(self.parse(newline.join(lines)), expected)
+
+    def test_strips_unicode_whitespace(self) -> None:
+        content = "=== a.bin | TfrmLeat | size=1\nActions (1):\n\u3000actFoo\u00a0\n"
+        self.assertEqual(self.parse(content), [("a.bin", "TfrmLeat", ["actFoo"], [])])
+
+
+class LoadActionTicketMapTest(unittest.TestCase):
+    def load(self, content: str) -> dict[str, tuple[str, str, str]]:
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "tickets.csv"
+            path.write_text(content, encoding="utf-8")
+            return artifacts.load_action_ticket_map(path)
+
+    def test_empty_file(self) -> None:
+        self.assertEqual(self.load(""), {})
+
+    def test_missing_action_column(self) -> None:
+        self.assertEqual(self.load("ticket_id,phase\nT-1,P1\n"), {})
+
+    def test_utf8_bom(self) -> None:
+        content = "\ufeffaction,ticket_id,feature_group,phase\nactFoo,T-1,grp,P1\n"
+        self.assertEqual(self.load(content), {"actFoo": ("T-1", "grp", "P1")})
+
+    def test_missing_optional_columns(self) -> None:
+        content = "action,ticket_id\n actFoo ,T-1\nactBar\n\n"
+        self.assertEqual(self.load(content), {"actFoo": ("T-1", "", ""), "actBar": ("", "", "")})
+
+
+if __name__ == "__main__":
+    unittest.main()